@@ -29,6 +29,13 @@ class Configs(BaseSettings):
 
     FILE_NAME_EDINET_SUBMISSIONS_DB: str = "edinet_submissions.db"
 
+    @property
+    def EDINET_SUBMISSIONS_DB_PATH(self) -> str:
+        """EDINET提出書類の一覧を管理するdbファイルのパス"""
+        return os.path.join(
+            self.BASE_PATH_CHECK_DOWNLOADED_DB, self.FILE_NAME_EDINET_SUBMISSIONS_DB
+        )
+
     class EdinetApi:
         BASE_URL: str = "https://disclosure.edinet-fsa.go.jp/api/v1"
         DOC_URL: str = os.path.join(BASE_URL, "documents")
@@ -55,5 +62,14 @@ class Configs(BaseSettings):
 
         CORPORATE_CONTENT_CODE = "010"
 
+    class FailedDownload:
+        ## 失敗したダウンロードの対象種別 ##
+        TARGET_SUBMISSION_DATE: str = "submission_date"  # 提出書類一覧の取得
+        TARGET_DOCUMENT: str = "document"  # 書類(zip)の取得
+
+        MAX_ATTEMPTS: int = 5  # この回数失敗した対象は自動リトライしない
+        BASE_RETRY_INTERVAL_SECONDS: int = 60 * 10  # 失敗毎に2倍ずつ延ばす
+        MAX_RETRY_INTERVAL_SECONDS: int = 60 * 60 * 24
+
 
 configs = Configs()
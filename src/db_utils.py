@@ -1,5 +1,8 @@
 import sqlite3
-from datetime import date
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from common.configs import configs
 
 
 def insert_company(db_path: str, filer_name: str, sec_code: str) -> int:
@@ -17,10 +20,15 @@ def insert_company(db_path: str, filer_name: str, sec_code: str) -> int:
         "SELECT company_id FROM companies WHERE filer_name = ? AND sec_code = ?",
         (filer_name, sec_code),
     )
-    company_id = cursor.fetchone()[0]
-
+    result = cursor.fetchone()
     conn.close()
-    return company_id
+
+    # INSERT OR IGNOREはNOT NULL制約違反も無視するため、ここで検出する
+    if result is None:
+        raise sqlite3.IntegrityError(
+            f"Failed to insert company: {filer_name=}, {sec_code=}"
+        )
+    return result[0]
 
 
 def insert_document(
@@ -45,3 +53,198 @@ def insert_document(
 
     conn.commit()
     conn.close()
+
+
+class FailedDownloadRecord(NamedTuple):
+    """failed_downloadsテーブルの1レコード"""
+
+    target_type: str
+    target_id: str
+    submission_date: date
+    filer_name: Optional[str]
+    sec_code: Optional[str]
+    error_class: str
+    attempt_count: int
+
+
+def calc_next_retry_at(attempt_count: int, now: datetime) -> datetime:
+    """失敗回数に応じて次回リトライ日時を計算する。
+    間隔は失敗毎に2倍になり、MAX_RETRY_INTERVAL_SECONDSで頭打ちになる。
+    """
+    interval_seconds = min(
+        configs.FailedDownload.BASE_RETRY_INTERVAL_SECONDS * 2 ** (attempt_count - 1),
+        configs.FailedDownload.MAX_RETRY_INTERVAL_SECONDS,
+    )
+    return now + timedelta(seconds=interval_seconds)
+
+
+def upsert_failed_download(
+    db_path: str,
+    target_type: str,
+    target_id: str,
+    submission_date: date,
+    error: BaseException,
+    filer_name: Optional[str] = None,
+    sec_code: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> int:
+    """取得に失敗した対象を記録し、これまでの失敗回数を返す。
+    既に記録されている場合は失敗回数を加算し、次回リトライ日時を更新する。
+    """
+    if now is None:
+        now = datetime.now()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        """
+        SELECT attempt_count FROM failed_downloads
+        WHERE target_type = ? AND target_id = ?
+        """,
+        (target_type, target_id),
+    )
+    result = cursor.fetchone()
+    attempt_count = result[0] + 1 if result else 1
+    next_retry_at = calc_next_retry_at(attempt_count, now)
+
+    cursor.execute(
+        """
+        INSERT INTO failed_downloads
+            (target_type, target_id, submission_date, filer_name, sec_code,
+             error_class, error_message, attempt_count, next_retry_at)
+        VALUES
+            (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (target_type, target_id) DO UPDATE SET
+            error_class = excluded.error_class,
+            error_message = excluded.error_message,
+            attempt_count = excluded.attempt_count,
+            next_retry_at = excluded.next_retry_at
+        """,
+        (
+            target_type,
+            target_id,
+            submission_date.isoformat(),
+            filer_name,
+            sec_code,
+            type(error).__name__,
+            str(error),
+            attempt_count,
+            next_retry_at.isoformat(timespec="seconds"),
+        ),
+    )
+
+    conn.commit()
+    conn.close()
+    return attempt_count
+
+
+def select_due_failed_downloads(
+    db_path: str,
+    now: Optional[datetime] = None,
+    max_attempts: int = configs.FailedDownload.MAX_ATTEMPTS,
+) -> list[FailedDownloadRecord]:
+    """リトライ日時を過ぎ、失敗回数が上限未満の対象を提出日順に取得する。
+    同じ提出日では、提出日の対象を書類の対象より先に並べる。
+    """
+    if now is None:
+        now = datetime.now()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        """
+        SELECT
+            target_type, target_id, submission_date, filer_name, sec_code,
+            error_class, attempt_count
+        FROM failed_downloads
+        WHERE next_retry_at <= ? AND attempt_count < ?
+        ORDER BY
+            submission_date,
+            CASE target_type WHEN ? THEN 0 ELSE 1 END,
+            target_id
+        """,
+        (
+            now.isoformat(timespec="seconds"),
+            max_attempts,
+            configs.FailedDownload.TARGET_SUBMISSION_DATE,
+        ),
+    )
+    records = [
+        FailedDownloadRecord(
+            target_type,
+            target_id,
+            date.fromisoformat(submission_date),
+            filer_name,
+            sec_code,
+            error_class,
+            attempt_count,
+        )
+        for (
+            target_type,
+            target_id,
+            submission_date,
+            filer_name,
+            sec_code,
+            error_class,
+            attempt_count,
+        ) in cursor.fetchall()
+    ]
+
+    conn.close()
+    return records
+
+
+def select_waiting_failed_downloads(
+    db_path: str,
+    submission_date: date,
+    now: Optional[datetime] = None,
+    max_attempts: int = configs.FailedDownload.MAX_ATTEMPTS,
+) -> set[tuple[str, str]]:
+    """指定した提出日の対象のうち、リトライ日時前または失敗回数が上限に達したものを
+    タプル(target_type, target_id)の集合で取得する
+    """
+    if now is None:
+        now = datetime.now()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        """
+        SELECT target_type, target_id FROM failed_downloads
+        WHERE submission_date = ? AND (next_retry_at > ? OR attempt_count >= ?)
+        """,
+        (
+            submission_date.isoformat(),
+            now.isoformat(timespec="seconds"),
+            max_attempts,
+        ),
+    )
+    targets = {(target_type, target_id) for target_type, target_id in cursor}
+
+    conn.close()
+    return targets
+
+
+def delete_failed_downloads(db_path: str, targets: list[tuple[str, str]]) -> None:
+    """取得に成功した対象をまとめて削除する
+
+    Args:
+        db_path (str): データベースのパス
+        targets (list[tuple[str, str]]): タプル(target_type, target_id)のリスト
+    """
+    if not targets:
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.executemany(
+        "DELETE FROM failed_downloads WHERE target_type = ? AND target_id = ?",
+        targets,
+    )
+
+    conn.commit()
+    conn.close()
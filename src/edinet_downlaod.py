@@ -1,6 +1,6 @@
 import os
 import sqlite3
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from logging import getLogger
 from typing import Generator, Optional
 
@@ -8,7 +8,14 @@ import requests
 
 from common.configs import configs
 from common.logger import init_logger
-from db_utils import insert_company, insert_document
+from db_utils import (
+    delete_failed_downloads,
+    insert_company,
+    insert_document,
+    select_due_failed_downloads,
+    select_waiting_failed_downloads,
+    upsert_failed_download,
+)
 
 init_logger(configs.LOGGER_CONFIG_PATH)
 
@@ -49,9 +56,9 @@ def generate_date_sequence(
     return date_list
 
 
-def fetch_edinet_submission_documents(
+def _request_submission_documents(
     submission_date: date, doc_type: str = configs.EdinetApi.DOC_TYPE_META_AND_DOC_DATA
-) -> Optional[requests.Response]:
+) -> requests.Response:
     """EDINET APIから指定日に提出されたドキュメント一覧をjson形式で取得する
 
     Args:
@@ -60,20 +67,19 @@ def fetch_edinet_submission_documents(
             1: メタ情報のみ, 2: メタ情報と文書データ. defaults to None (2).
 
     Returns:
-        Optional[requests.Response]: 成功時はレスポンスオブジェクト、失敗時はNone
+        requests.Response: レスポンスオブジェクト
+
+    Raises:
+        requests.RequestException: 通信に失敗した場合、または200以外のステータスの場合
     """
     logger.info(f"Fetching EDINET document data for {doc_type=} on {submission_date}")
 
     url = configs.EdinetApi.DOC_JSON_URL
     params = {"date": submission_date.strftime("%Y-%m-%d"), "type": doc_type}
 
-    try:
-        res = requests.get(url, params=params, timeout=configs.EdinetApi.TIME_OUT)
-        res.raise_for_status()  # 200以外のステータスコードをエラーとして扱う
-        return res
-    except requests.RequestException as e:
-        logger.error(f"Failed to fetch EDINET document data: {e}")
-        return None
+    res = requests.get(url, params=params, timeout=configs.EdinetApi.TIME_OUT)
+    res.raise_for_status()  # 200以外のステータスコードをエラーとして扱う
+    return res
 
 
 def extract_securities_info(
@@ -99,32 +105,37 @@ def extract_securities_info(
         # secCodeが存在するかどうかで上場企業かどうかを判定
         is_listed_company = result.get("secCode") is not None
 
-        if is_securities_report and is_listed_company:
-            yield (result.get("filerName"), result.get("docID"), result.get("secCode"))
+        if not (is_securities_report and is_listed_company):
+            continue
+
+        # filerNameかdocIDが欠けている書類は保存・記録できないためスキップする
+        if result.get("filerName") is None or result.get("docID") is None:
+            logger.warning(f"Skipping result without filerName or docID: {result}")
+            continue
+
+        yield (result.get("filerName"), result.get("docID"), result.get("secCode"))
 
 
-def fetch_edinet_document_binary(doc_id: str) -> Optional[requests.Response]:
-    """docIDから書類をバイナリ形式で取得する。取得できない場合はNoneを返す。
+def _request_document_binary(doc_id: str) -> requests.Response:
+    """docIDから書類をバイナリ形式で取得する
 
     Args:
         doc_id (str): 書類のID
 
     Returns:
-        Optional[requests.Response]:
-            成功時はレスポンスオブジェクト。有価証券報告書のzipファイルが格納されている。
-            失敗時はNone
+        requests.Response:
+            レスポンスオブジェクト。有価証券報告書のzipファイルが格納されている。
+
+    Raises:
+        requests.RequestException: 通信に失敗した場合、または200以外のステータスの場合
     """
-    try:
-        url = os.path.join(configs.EdinetApi.DOC_URL, doc_id)
-        params = {"type": configs.EdinetApi.DOC_TYPE_XBRL}
-        res = requests.get(
-            url, params=params, stream=True, timeout=configs.EdinetApi.TIME_OUT
-        )
-        res.raise_for_status()  # 200以外のステータスコードをエラーとして扱う
-        return res
-    except requests.RequestException as e:
-        logger.error(f"書類の取得に失敗しました。doc_id={doc_id}, エラー: {e}")
-        return None
+    url = os.path.join(configs.EdinetApi.DOC_URL, doc_id)
+    params = {"type": configs.EdinetApi.DOC_TYPE_XBRL}
+    res = requests.get(
+        url, params=params, stream=True, timeout=configs.EdinetApi.TIME_OUT
+    )
+    res.raise_for_status()  # 200以外のステータスコードをエラーとして扱う
+    return res
 
 
 def save_report_zip_with_db_record(
@@ -133,7 +144,7 @@ def save_report_zip_with_db_record(
     doc_id: str,
     sec_code: str,
     binary_res: requests.Response,
-    db_path: str = configs.BASE_PATH_CHECK_DOWNLOADED_DB,
+    db_path: str = configs.EDINET_SUBMISSIONS_DB_PATH,
     root_path: Optional[str] = None,
 ) -> None:
     """有価証券報告書のバイナリファイルをzip形式で保存する
@@ -146,7 +157,7 @@ def save_report_zip_with_db_record(
         binary_res (requests.Response): バイナリデータ
         db_path (str, optional):
             ダウンロード済み書類を記録するデータベースのパス.
-            defaults to configs.BASE_PATH_CHECK_DOWNLOADED_DB.
+            defaults to configs.EDINET_SUBMISSIONS_DB_PATH.
         root_path (Optional[str], optional):
             ダウンロード先のルートディレクトリパス. defaults to None.
     """
@@ -177,11 +188,19 @@ def save_report_zip_with_db_record(
         return
 
     # ダウンロード処理
-    with open(zip_file_path, "wb") as f:
-        for chunk in binary_res.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
-        logger.info(f"Downloaded zip file: {zip_file_path}")
+    # 途中で失敗した不完全なzipがリトライ時にダウンロード済みと見なされないよう、
+    # 一時ファイルに書き込んでから置き換える
+    part_file_path = f"{zip_file_path}.part"
+    try:
+        with open(part_file_path, "wb") as f:
+            for chunk in binary_res.iter_content(chunk_size=1024):
+                if chunk:
+                    f.write(chunk)
+        os.replace(part_file_path, zip_file_path)
+    finally:
+        if os.path.exists(part_file_path):
+            os.remove(part_file_path)
+    logger.info(f"Downloaded zip file: {zip_file_path}")
 
     # ダウンロード済みの書類をデータベースに記録
     insert_document(db_path, doc_id, submission_day, company_id, True)
@@ -195,3 +214,187 @@ def check_document_downloaded(db_path: str, doc_id: str) -> bool:
     result = cursor.fetchone()
     conn.close()
     return result and result[0]
+
+
+def process_document(
+    submission_date: date,
+    filer_name: str,
+    doc_id: str,
+    sec_code: str,
+    db_path: str = configs.EDINET_SUBMISSIONS_DB_PATH,
+    root_path: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> bool:
+    """書類を1件ダウンロードする。通信・ファイル書き込みに失敗した場合は
+    例外を送出せず、failed_downloadsテーブルに記録する。
+    dbのエラーはリトライしても解決しないため、そのまま送出する。
+
+    Args:
+        submission_date (date): 提出日
+        filer_name (str): 提出者名（会社名）
+        doc_id (str): 書類ID
+        sec_code (str): 証券コード
+        db_path (str, optional):
+            ダウンロード済み書類・失敗した対象を記録するデータベースのパス.
+            defaults to configs.EDINET_SUBMISSIONS_DB_PATH.
+        root_path (Optional[str], optional):
+            ダウンロード先のルートディレクトリパス. defaults to None.
+        now (Optional[datetime], optional):
+            リトライ日時の判定・計算に使う現在日時.
+            defaults to None (datetime.now()).
+
+    Returns:
+        bool: 成功時はTrue、失敗時はFalse
+    """
+    if check_document_downloaded(db_path, doc_id):
+        logger.debug(f"{doc_id=} is already downloaded. Skipping request.")
+        return True
+
+    try:
+        # stream=Trueで取得するため、保存をスキップした場合も接続を解放する
+        with _request_document_binary(doc_id) as binary_res:
+            save_report_zip_with_db_record(
+                submission_date,
+                filer_name,
+                doc_id,
+                sec_code,
+                binary_res,
+                db_path,
+                root_path,
+            )
+        return True
+    except (requests.RequestException, OSError, ValueError) as e:
+        attempt_count = upsert_failed_download(
+            db_path,
+            configs.FailedDownload.TARGET_DOCUMENT,
+            doc_id,
+            submission_date,
+            e,
+            filer_name=filer_name,
+            sec_code=sec_code,
+            now=now,
+        )
+        logger.error(
+            f"書類のダウンロードに失敗しました。{doc_id=}, {attempt_count=}, "
+            f"エラー: {type(e).__name__}: {e}"
+        )
+        return False
+
+
+def process_submission_date(
+    submission_date: date,
+    db_path: str = configs.EDINET_SUBMISSIONS_DB_PATH,
+    root_path: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> bool:
+    """指定日に提出された有価証券報告書を全てダウンロードする。
+    書類一覧の取得に失敗した場合は提出日を、個々の書類の取得に失敗した場合は
+    その書類をfailed_downloadsテーブルに記録し、成功したものは削除する。
+    リトライ日時前または失敗回数が上限に達した提出日・書類はスキップする。
+
+    Args:
+        submission_date (date): 提出日
+        db_path (str, optional):
+            ダウンロード済み書類・失敗した対象を記録するデータベースのパス.
+            defaults to configs.EDINET_SUBMISSIONS_DB_PATH.
+        root_path (Optional[str], optional):
+            ダウンロード先のルートディレクトリパス. defaults to None.
+        now (Optional[datetime], optional):
+            リトライ日時の判定・計算に使う現在日時.
+            defaults to None (datetime.now()).
+
+    Returns:
+        bool: 書類一覧の取得に成功した場合はTrue、失敗・スキップした場合はFalse
+    """
+    waiting_targets = select_waiting_failed_downloads(db_path, submission_date, now)
+    if (
+        configs.FailedDownload.TARGET_SUBMISSION_DATE,
+        submission_date.isoformat(),
+    ) in waiting_targets:
+        logger.info(f"Skipping {submission_date=} waiting for retry")
+        return False
+
+    try:
+        res = _request_submission_documents(submission_date)
+        securities_info = list(extract_securities_info(res))
+    except (requests.RequestException, OSError, ValueError) as e:
+        attempt_count = upsert_failed_download(
+            db_path,
+            configs.FailedDownload.TARGET_SUBMISSION_DATE,
+            submission_date.isoformat(),
+            submission_date,
+            e,
+            now=now,
+        )
+        logger.error(
+            f"書類一覧の取得に失敗しました。{submission_date=}, {attempt_count=}, "
+            f"エラー: {type(e).__name__}: {e}"
+        )
+        return False
+
+    succeeded_targets = [
+        (configs.FailedDownload.TARGET_SUBMISSION_DATE, submission_date.isoformat())
+    ]
+    for filer_name, doc_id, sec_code in securities_info:
+        if (configs.FailedDownload.TARGET_DOCUMENT, doc_id) in waiting_targets:
+            logger.info(f"Skipping {doc_id=} waiting for retry")
+            continue
+        if process_document(
+            submission_date, filer_name, doc_id, sec_code, db_path, root_path, now
+        ):
+            succeeded_targets.append((configs.FailedDownload.TARGET_DOCUMENT, doc_id))
+
+    delete_failed_downloads(db_path, succeeded_targets)
+    return True
+
+
+def retry_failed_downloads(
+    db_path: str = configs.EDINET_SUBMISSIONS_DB_PATH,
+    root_path: Optional[str] = None,
+    now: Optional[datetime] = None,
+) -> None:
+    """failed_downloadsテーブルからリトライ日時を過ぎた対象をまとめて取得し、
+    再ダウンロードする。成功したものはまとめて削除し、
+    失敗したものは失敗回数と次回リトライ日時を更新する。
+
+    Args:
+        db_path (str, optional):
+            ダウンロード済み書類・失敗した対象を記録するデータベースのパス.
+            defaults to configs.EDINET_SUBMISSIONS_DB_PATH.
+        root_path (Optional[str], optional):
+            ダウンロード先のルートディレクトリパス. defaults to None.
+        now (Optional[datetime], optional):
+            リトライ日時の判定・計算に使う現在日時.
+            defaults to None (datetime.now()).
+    """
+    records = select_due_failed_downloads(db_path, now)
+    if not records:
+        return
+
+    logger.info(f"Retrying {len(records)} failed downloads")
+
+    # 提出日の対象は同じ提出日の書類より先に並んでいる。
+    # 提出日を再処理した場合、その日の書類も再処理されるため個別にはリトライしない
+    retried_dates: set[date] = set()
+    succeeded_targets: list[tuple[str, str]] = []
+    for record in records:
+        if record.target_type == configs.FailedDownload.TARGET_SUBMISSION_DATE:
+            process_submission_date(record.submission_date, db_path, root_path, now)
+            retried_dates.add(record.submission_date)
+        elif record.submission_date in retried_dates:
+            continue
+        else:
+            # 書類の対象はprocess_documentのみが記録し、必ず両方の値を持つ
+            assert record.filer_name is not None and record.sec_code is not None
+            if process_document(
+                record.submission_date,
+                record.filer_name,
+                record.target_id,
+                record.sec_code,
+                db_path,
+                root_path,
+                now,
+            ):
+                succeeded_targets.append((record.target_type, record.target_id))
+
+    delete_failed_downloads(db_path, succeeded_targets)
@@ -4,12 +4,11 @@ from logging import getLogger
 from common.configs import configs
 from common.logger import init_logger
 from edinet_downlaod import (
-    extract_securities_info,
-    fetch_edinet_document_binary,
-    fetch_edinet_submission_documents,
     generate_date_sequence,
-    save_report_zip_with_db_record,
+    process_submission_date,
+    retry_failed_downloads,
 )
+from setup_enviroment import initialize_db
 
 init_logger(configs.LOGGER_CONFIG_PATH)
 
@@ -19,15 +18,17 @@ logger = getLogger(__name__)
 def main() -> None:
     logger.info("Start main")
 
+    # 既存のdbに後から追加されたテーブルを作成する（作成済みのテーブルはそのまま）
+    initialize_db(configs.BASE_PATH_CHECK_DOWNLOADED_DB)
+    db_path = configs.EDINET_SUBMISSIONS_DB_PATH
+
+    # 前回までに失敗した提出日・書類を先にリトライする
+    retry_failed_downloads(db_path)
+
     date_list = generate_date_sequence(date(2024, 3, 25), date(2024, 3, 25))
 
     for submission_date in date_list:
-        res = fetch_edinet_submission_documents(submission_date)
-        for filer_name, doc_id, sec_code in extract_securities_info(res):
-            binary_res = fetch_edinet_document_binary(doc_id)
-            save_report_zip_with_db_record(
-                submission_date, filer_name, doc_id, sec_code, binary_res
-            )
+        process_submission_date(submission_date, db_path)
 
     logger.info("End main")
 
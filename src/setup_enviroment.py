@@ -68,6 +68,28 @@ def initialize_db(db_base_path: str = configs.BASE_PATH_CHECK_DOWNLOADED_DB) ->
         "CREATE INDEX IF NOT EXISTS idx_company_id ON documents (company_id);"
     )
 
+    # failed_downloadsテーブルの作成（取得に失敗した提出日・書類のリトライキュー）
+    # target_typeが"submission_date"の場合、target_idは提出日(YYYY-MM-DD)
+    # target_typeが"document"の場合、target_idはdocID
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS failed_downloads (
+            target_type TEXT NOT NULL,
+            target_id TEXT NOT NULL,
+            submission_date DATE NOT NULL,
+            filer_name TEXT,
+            sec_code TEXT,
+            error_class TEXT NOT NULL,
+            error_message TEXT,
+            attempt_count INTEGER NOT NULL DEFAULT 1,
+            next_retry_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (target_type, target_id)
+        );
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_next_retry_at "
+        "ON failed_downloads (next_retry_at);"
+    )
+
     conn.commit()
     conn.close()
 
@@ -1,5 +1,19 @@
 from logging import getLogger
+from pathlib import Path
+
+import pytest
+from src.setup_enviroment import initialize_db
+
+from common.configs import configs
 
 logger = getLogger(__name__)
 
 logger.info("Start edinet_download conftest.py")
+
+
+@pytest.fixture
+def db_file_path(tmp_path: Path) -> str:
+    """初期化済みの一時データベースのパスを返す"""
+    db_base_path = tmp_path / "db"
+    initialize_db(str(db_base_path))
+    return str(db_base_path / configs.FILE_NAME_EDINET_SUBMISSIONS_DB)
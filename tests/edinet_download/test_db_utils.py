@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from common.configs import configs
+from db_utils import (
+    calc_next_retry_at,
+    delete_failed_downloads,
+    insert_company,
+    select_due_failed_downloads,
+    upsert_failed_download,
+)
+
+NOW = datetime(2024, 3, 26, 9, 0, 0)
+
+
+def test_calc_next_retry_at() -> None:
+    base = configs.FailedDownload.BASE_RETRY_INTERVAL_SECONDS
+    assert calc_next_retry_at(1, NOW) == NOW + timedelta(seconds=base)
+    assert calc_next_retry_at(3, NOW) == NOW + timedelta(seconds=base * 4)
+    # 上限を超えない
+    assert calc_next_retry_at(100, NOW) == NOW + timedelta(
+        seconds=configs.FailedDownload.MAX_RETRY_INTERVAL_SECONDS
+    )
+
+
+def test_upsert_failed_download_increments_attempt_count(db_file_path: str) -> None:
+    target_type = configs.FailedDownload.TARGET_DOCUMENT
+    args = (db_file_path, target_type, "S100AAAA", date(2024, 3, 25))
+
+    assert upsert_failed_download(*args, TimeoutError("timeout"), now=NOW) == 1
+    assert upsert_failed_download(*args, ValueError("broken"), now=NOW) == 2
+
+    # 2回目の失敗後のリトライ日時より前は対象外
+    assert select_due_failed_downloads(db_file_path, now=NOW) == []
+
+    records = select_due_failed_downloads(db_file_path, now=calc_next_retry_at(2, NOW))
+    assert len(records) == 1
+    assert records[0].target_id == "S100AAAA"
+    assert records[0].submission_date == date(2024, 3, 25)
+    assert records[0].error_class == "ValueError"
+    assert records[0].attempt_count == 2
+
+
+def test_select_due_failed_downloads_skips_exhausted(db_file_path: str) -> None:
+    target_type = configs.FailedDownload.TARGET_DOCUMENT
+    for _ in range(configs.FailedDownload.MAX_ATTEMPTS):
+        upsert_failed_download(
+            db_file_path, target_type, "S100AAAA", date(2024, 3, 25), OSError(), now=NOW
+        )
+
+    later = NOW + timedelta(days=365)
+    assert select_due_failed_downloads(db_file_path, now=later) == []
+
+
+def test_delete_failed_downloads(db_file_path: str) -> None:
+    target_type = configs.FailedDownload.TARGET_DOCUMENT
+    for doc_id in ["S100AAAA", "S100BBBB", "S100CCCC"]:
+        upsert_failed_download(
+            db_file_path, target_type, doc_id, date(2024, 3, 25), OSError(), now=NOW
+        )
+
+    delete_failed_downloads(
+        db_file_path, [(target_type, "S100AAAA"), (target_type, "S100CCCC")]
+    )
+
+    later = NOW + timedelta(days=1)
+    records = select_due_failed_downloads(db_file_path, now=later)
+    assert [record.target_id for record in records] == ["S100BBBB"]
+
+
+def test_select_due_failed_downloads_orders_dates_first(db_file_path: str) -> None:
+    submission_date = date(2024, 3, 25)
+    upsert_failed_download(
+        db_file_path,
+        configs.FailedDownload.TARGET_DOCUMENT,
+        "S100AAAA",
+        submission_date,
+        OSError(),
+        now=NOW,
+    )
+    upsert_failed_download(
+        db_file_path,
+        configs.FailedDownload.TARGET_SUBMISSION_DATE,
+        submission_date.isoformat(),
+        submission_date,
+        OSError(),
+        now=NOW,
+    )
+
+    later = NOW + timedelta(days=1)
+    records = select_due_failed_downloads(db_file_path, now=later)
+    assert [record.target_type for record in records] == [
+        configs.FailedDownload.TARGET_SUBMISSION_DATE,
+        configs.FailedDownload.TARGET_DOCUMENT,
+    ]
+
+
+def test_insert_company_raises_on_null_filer_name(db_file_path: str) -> None:
+    with pytest.raises(sqlite3.IntegrityError):
+        insert_company(db_file_path, None, "10000")
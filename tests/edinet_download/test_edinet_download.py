@@ -1,15 +1,27 @@
 import os
-from datetime import date, timedelta
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
 from typing import Optional
 
 import pytest
+import requests
 import requests_mock
 
 from common.configs import configs
+from db_utils import (
+    insert_company,
+    insert_document,
+    select_due_failed_downloads,
+    upsert_failed_download,
+)
 from edinet_downlaod import (
-    fetch_edinet_document_binary,
-    fetch_edinet_submission_documents,
+    _request_document_binary,
+    _request_submission_documents,
     generate_date_sequence,
+    process_document,
+    process_submission_date,
+    retry_failed_downloads,
 )
 
 
@@ -80,7 +92,7 @@ def test_generate_date_sequence(
         ),
     ],
 )
-def test_fetch_edinet_document_data(
+def test_request_submission_documents(
     day: date, doc_type: str, expected_status: int
 ) -> None:
     with requests_mock.Mocker() as m:
@@ -90,7 +102,7 @@ def test_fetch_edinet_document_data(
         # API URLをモックURLに一時的に置き換え
         configs.EdinetApi.DOC_JSON_URL = "mock://testurl"
 
-        response = fetch_edinet_submission_documents(day, doc_type)
+        response = _request_submission_documents(day, doc_type)
         assert response.status_code == expected_status
 
 
@@ -101,16 +113,194 @@ def test_fetch_edinet_document_data(
         ("invalid_doc_id", 404),  # 失敗ケース
     ],
 )
-def test_fetch_edinet_document_binary(doc_id: str, expected_status: int) -> None:
+def test_request_document_binary(doc_id: str, expected_status: int) -> None:
     mock_url = os.path.join(configs.EdinetApi.DOC_URL, doc_id)  # モックするURLを構築
 
     with requests_mock.Mocker() as m:
         m.get(mock_url, status_code=expected_status)
 
-        response = fetch_edinet_document_binary(doc_id)
-
         if expected_status == 200:
-            assert response is not None
+            response = _request_document_binary(doc_id)
             assert response.status_code == expected_status
         else:
-            assert response is None
+            with pytest.raises(requests.HTTPError):
+                _request_document_binary(doc_id)
+
+
+def _submission_documents_json(doc_ids: list[str]) -> dict[str, list[dict[str, str]]]:
+    """書類一覧APIのレスポンスを模したjsonを生成する"""
+    return {
+        "results": [
+            {
+                "ordinanceCode": configs.EdinetDocument.CORPORATE_CONTENT_CODE,
+                "formCode": configs.EdinetDocument.SECURITIES_REPORT_CODE,
+                "secCode": f"1000{i}",
+                "filerName": f"company_{i}",
+                "docID": doc_id,
+            }
+            for i, doc_id in enumerate(doc_ids)
+        ]
+    }
+
+
+def test_process_submission_date_isolates_failed_document(
+    db_file_path: str, tmp_path: Path
+) -> None:
+    submission_date = date(2024, 3, 25)
+    root_path = str(tmp_path / "zip")
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            configs.EdinetApi.DOC_JSON_URL,
+            json=_submission_documents_json(["S100AAAA", "S100BBBB"]),
+        )
+        m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA"), status_code=500)
+        m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100BBBB"), content=b"zip")
+
+        assert process_submission_date(submission_date, db_file_path, root_path)
+
+    assert not (tmp_path / "zip/2024/03/25/S100AAAA.zip").exists()
+    assert (tmp_path / "zip/2024/03/25/S100BBBB.zip").read_bytes() == b"zip"
+
+    later = datetime.now() + timedelta(days=1)
+    records = select_due_failed_downloads(db_file_path, now=later)
+    assert [(r.target_id, r.error_class) for r in records] == [
+        ("S100AAAA", "HTTPError")
+    ]
+
+
+def test_retry_failed_downloads(db_file_path: str, tmp_path: Path) -> None:
+    submission_date = date(2024, 3, 25)
+    root_path = str(tmp_path / "zip")
+
+    # 書類一覧の取得に失敗した提出日が記録される
+    with requests_mock.Mocker() as m:
+        m.get(configs.EdinetApi.DOC_JSON_URL, exc=requests.ConnectTimeout)
+
+        assert not process_submission_date(submission_date, db_file_path, root_path)
+
+    later = datetime.now() + timedelta(days=1)
+    records = select_due_failed_downloads(db_file_path, now=later)
+    assert [(r.target_type, r.error_class) for r in records] == [
+        (configs.FailedDownload.TARGET_SUBMISSION_DATE, "ConnectTimeout")
+    ]
+
+    # リトライ日時前は何もしない
+    with requests_mock.Mocker() as m:
+        retry_failed_downloads(db_file_path, root_path)
+        assert not m.called
+
+    # リトライに成功すると記録が削除される
+    with requests_mock.Mocker() as m:
+        m.get(
+            configs.EdinetApi.DOC_JSON_URL,
+            json=_submission_documents_json(["S100AAAA"]),
+        )
+        m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA"), content=b"zip")
+
+        retry_failed_downloads(db_file_path, root_path, now=later)
+
+    assert (tmp_path / "zip/2024/03/25/S100AAAA.zip").read_bytes() == b"zip"
+    assert select_due_failed_downloads(db_file_path, now=later) == []
+
+
+def test_process_submission_date_skips_waiting_document(
+    db_file_path: str, tmp_path: Path
+) -> None:
+    """リトライパスと日付のループが同じ書類を重複して処理しないか確認する"""
+    submission_date = date(2024, 3, 25)
+    root_path = str(tmp_path / "zip")
+    doc_url = os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA")
+    later = datetime.now() + timedelta(days=1)
+    far_future = datetime.now() + timedelta(days=365)
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            configs.EdinetApi.DOC_JSON_URL,
+            json=_submission_documents_json(["S100AAAA"]),
+        )
+        doc_mock = m.get(doc_url, status_code=500)
+
+        process_submission_date(submission_date, db_file_path, root_path)
+        retry_failed_downloads(db_file_path, root_path, now=later)
+        assert doc_mock.call_count == 2
+
+        # リトライパスで失敗した書類は、同じ実行の日付のループでは取得しない
+        assert process_submission_date(
+            submission_date, db_file_path, root_path, now=later
+        )
+        assert doc_mock.call_count == 2
+        records = select_due_failed_downloads(db_file_path, now=far_future)
+        assert [record.attempt_count for record in records] == [2]
+
+        # 失敗回数が上限に達した書類は、リトライ日時を過ぎても取得しない
+        for _ in range(configs.FailedDownload.MAX_ATTEMPTS):
+            upsert_failed_download(
+                db_file_path,
+                configs.FailedDownload.TARGET_DOCUMENT,
+                "S100AAAA",
+                submission_date,
+                OSError(),
+            )
+        process_submission_date(submission_date, db_file_path, root_path, far_future)
+        assert doc_mock.call_count == 2
+
+
+def test_process_document_raises_db_error(tmp_path: Path) -> None:
+    """dbのエラーはリトライ対象として記録せずに送出されるか確認する"""
+    db_file_path = str(tmp_path / "uninitialized.db")
+    doc_url = os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA")
+
+    with requests_mock.Mocker() as m:
+        m.get(doc_url, content=b"zip")
+
+        with pytest.raises(sqlite3.OperationalError):
+            process_document(
+                date(2024, 3, 25),
+                "company",
+                "S100AAAA",
+                "10000",
+                db_file_path,
+                str(tmp_path / "zip"),
+            )
+
+
+def test_process_submission_date_skips_result_without_filer_name(
+    db_file_path: str, tmp_path: Path
+) -> None:
+    """filerNameが無い書類をスキップし、後続の書類を処理できるか確認する"""
+    documents_json = _submission_documents_json(["S100AAAA", "S100BBBB"])
+    documents_json["results"][0]["filerName"] = None
+
+    with requests_mock.Mocker() as m:
+        m.get(configs.EdinetApi.DOC_JSON_URL, json=documents_json)
+        skipped_mock = m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA"))
+        m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100BBBB"), content=b"zip")
+
+        assert process_submission_date(
+            date(2024, 3, 25), db_file_path, str(tmp_path / "zip")
+        )
+        assert not skipped_mock.called
+
+    assert (tmp_path / "zip/2024/03/25/S100BBBB.zip").read_bytes() == b"zip"
+
+
+def test_process_submission_date_skips_downloaded_document(
+    db_file_path: str, tmp_path: Path
+) -> None:
+    """ダウンロード済みの書類をリクエストしないか確認する"""
+    submission_date = date(2024, 3, 25)
+    company_id = insert_company(db_file_path, "company_0", "10000")
+    insert_document(db_file_path, "S100AAAA", submission_date, company_id, True)
+
+    with requests_mock.Mocker() as m:
+        m.get(
+            configs.EdinetApi.DOC_JSON_URL,
+            json=_submission_documents_json(["S100AAAA"]),
+        )
+        doc_mock = m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA"))
+
+        assert process_submission_date(
+            submission_date, db_file_path, str(tmp_path / "zip")
+        )
+        assert not doc_mock.called
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pytest
+import requests_mock
+from src.setup_enviroment import initialize_db
+
+from common.configs import configs
+from db_utils import select_due_failed_downloads, upsert_failed_download
+from main import main
+
+
+def test_main_retries_on_configured_db_path(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """.envで指定したディレクトリのdbを使ってリトライできるか確認する"""
+    monkeypatch.setattr(configs, "BASE_PATH_CHECK_DOWNLOADED_DB", str(tmp_path / "db"))
+    monkeypatch.setattr(configs, "BASE_PATH_DOWNLOAD_ZIP", str(tmp_path / "zip"))
+    initialize_db(configs.BASE_PATH_CHECK_DOWNLOADED_DB)
+
+    past = datetime.now() - timedelta(days=1)
+    upsert_failed_download(
+        configs.EDINET_SUBMISSIONS_DB_PATH,
+        configs.FailedDownload.TARGET_DOCUMENT,
+        "S100AAAA",
+        date(2024, 3, 1),
+        TimeoutError("timeout"),
+        filer_name="company",
+        sec_code="10000",
+        now=past,
+    )
+
+    with requests_mock.Mocker() as m:
+        m.get(configs.EdinetApi.DOC_JSON_URL, json={"results": []})
+        m.get(os.path.join(configs.EdinetApi.DOC_URL, "S100AAAA"), content=b"zip")
+
+        main()
+
+    assert (tmp_path / "zip/2024/03/01/S100AAAA.zip").read_bytes() == b"zip"
+    later = datetime.now() + timedelta(days=365)
+    assert select_due_failed_downloads(configs.EDINET_SUBMISSIONS_DB_PATH, later) == []
+
+
+def test_main_creates_missing_failed_downloads_table(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """failed_downloadsテーブルが無い既存のdbでも実行できるか確認する"""
+    db_base_path = tmp_path / "db"
+    db_base_path.mkdir()
+    monkeypatch.setattr(configs, "BASE_PATH_CHECK_DOWNLOADED_DB", str(db_base_path))
+    monkeypatch.setattr(configs, "BASE_PATH_DOWNLOAD_ZIP", str(tmp_path / "zip"))
+
+    conn = sqlite3.connect(configs.EDINET_SUBMISSIONS_DB_PATH)
+    conn.execute("""
+        CREATE TABLE companies (
+            company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filer_name TEXT NOT NULL,
+            sec_code TEXT NOT NULL,
+            UNIQUE(filer_name, sec_code)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE documents (
+            doc_id TEXT PRIMARY KEY,
+            submission_date DATE NOT NULL,
+            company_id INTEGER NOT NULL,
+            downloaded INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (company_id) REFERENCES companies(company_id)
+        );
+    """)
+    conn.commit()
+    conn.close()
+
+    with requests_mock.Mocker() as m:
+        m.get(configs.EdinetApi.DOC_JSON_URL, json={"results": []})
+
+        main()
+
+    later = datetime.now() + timedelta(days=365)
+    assert select_due_failed_downloads(configs.EDINET_SUBMISSIONS_DB_PATH, later) == []